@@ -1,14 +1,17 @@
+import csv
+import logging
 import os
 from pathlib import Path
 
 import napari
 import numpy as np
-import pandas as pd
 from magicgui.widgets import create_widget
 from napari.layers.points._points_constants import Mode
+from napari.utils.colormaps.standardize_color import transform_color
 from napari_guitils.gui_structures import TabSet, VHGroup
-from qtpy.QtCore import Qt
+from qtpy.QtCore import QSignalBlocker, Qt, Slot
 from qtpy.QtWidgets import (
+    QAbstractButton,
     QButtonGroup,
     QFileDialog,
     QLabel,
@@ -19,6 +22,7 @@ from qtpy.QtWidgets import (
     QVBoxLayout,
     QWidget,
 )
+from superqt.utils import qthrottled
 
 # Define keypoints colors and values, eventually will be defined by user
 INITIAL_SELECTED_KEYPOINT = "first_bulb"  # Default class
@@ -30,6 +34,42 @@ KEYPOINT_COLORS = {
 }
 KEYPOINT_VALUES = {"first_bulb": 0, "ismuth": 1, "terminal_bulb": 2}
 
+logger = logging.getLogger(__name__)
+
+# Derived lookup tables, shared by every widget instance
+_KEYPOINT_INDEX = {kp: i for i, kp in enumerate(KEYPOINTS)}
+_COLOR_TO_KEYPOINT = {
+    KEYPOINT_COLORS[kp]: KEYPOINT_VALUES[kp] for kp in KEYPOINTS
+}
+_VALUE_TO_NAME = {value: kp for kp, value in KEYPOINT_VALUES.items()}
+_VALUE_TO_COLOR = {
+    KEYPOINT_VALUES[kp]: KEYPOINT_COLORS[kp] for kp in KEYPOINTS
+}
+
+# Empty seed arrays for new annotation layers; allocated once, and
+# np.empty skips the pointless zero-fill of a (0, n) array
+_EMPTY_2D = np.empty((0, 2), dtype=np.float64)
+_EMPTY_3D = np.empty((0, 3), dtype=np.float64)
+
+# Fallback color for KeypointIDs outside the palette
+_UNKNOWN_COLOR = np.array((0.5, 0.5, 0.5, 1.0), dtype=np.float32)
+
+# Directory listings keyed by path; entries are (mtime_ns, sorted paths)
+_listdir_cache = {}
+
+
+def _cached_listdir(dir_path):
+    """Return the sorted file paths in ``dir_path``, re-listing the
+    directory only when its mtime has changed since the last call."""
+    mtime = os.stat(dir_path).st_mtime_ns
+    cached = _listdir_cache.get(dir_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with os.scandir(dir_path) as entries:
+        files = sorted(entry.path for entry in entries if entry.is_file())
+    _listdir_cache[dir_path] = (mtime, files)
+    return files
+
 
 class KeypointAnnotatorWidget(QWidget):
     """
@@ -47,21 +87,31 @@ class KeypointAnnotatorWidget(QWidget):
         self.current_file_idx = 0
         self.selected_reference_layer = ""
         self.selected_annotation_layer = ""
+        # Cached layer object matching selected_annotation_layer, to avoid
+        # name-based LayerList scans in the annotation hot paths
+        self._annotation_layer_obj = None
         self.keypoint_values = KEYPOINT_VALUES
         self.selected_keypoint = INITIAL_SELECTED_KEYPOINT
+        self._selected_idx = _KEYPOINT_INDEX[INITIAL_SELECTED_KEYPOINT]
         self.keypoint_colors = KEYPOINT_COLORS
-        # Map colors to class values using tuples as keys
-        self.color_to_keypoint = {
-            self.keypoint_colors[cls]: self.keypoint_values[cls]
-            for cls in self.keypoint_colors
-        }
-        self.keypoint_values_to_color = {
-            self.keypoint_values[cls]: self.keypoint_colors[cls]
-            for cls in self.keypoint_colors
-        }
-        self.keypoint_values_to_name = {
-            self.keypoint_values[cls]: cls for cls in self.keypoint_colors
-        }
+        self.color_to_keypoint = _COLOR_TO_KEYPOINT
+        self.keypoint_values_to_color = _VALUE_TO_COLOR
+        self.keypoint_values_to_name = _VALUE_TO_NAME
+        # Color palette as a (K, 4) array, row i being the color of the
+        # keypoint with value i, for vectorized color <-> keypoint lookups
+        self._palette_names = [
+            self.keypoint_values_to_name[value]
+            for value in range(len(KEYPOINTS))
+        ]
+        self._palette = np.array(
+            [self.keypoint_colors[name] for name in self._palette_names],
+            dtype=np.float32,
+        )
+        # Sorted packed-uint32 hashes of the palette colors, for exact-match
+        # lookup that is robust to float32 rounding of face_color
+        palette_hash = self._pack_colors(self._palette)
+        self._palette_hash_order = np.argsort(palette_hash)
+        self._palette_hash_sorted = palette_hash[self._palette_hash_order]
 
         self.viewer = napari_viewer
 
@@ -85,12 +135,6 @@ class KeypointAnnotatorWidget(QWidget):
         )
 
         self.select_reference_layer_widget.reset_choices()
-        self.viewer.layers.events.inserted.connect(
-            self.select_reference_layer_widget.reset_choices
-        )
-        self.viewer.layers.events.removed.connect(
-            self.select_reference_layer_widget.reset_choices
-        )
 
         self.layer_selection_group.glayout.addWidget(
             QLabel("Reference layer"), 0, 0, 1, 1
@@ -104,12 +148,14 @@ class KeypointAnnotatorWidget(QWidget):
             annotation=napari.layers.Points, label="Pick annotation"
         )
         self.select_annotation_layer_widget.reset_choices()
-        self.viewer.layers.events.inserted.connect(
-            self.select_annotation_layer_widget.reset_choices
-        )
-        self.viewer.layers.events.removed.connect(
-            self.select_annotation_layer_widget.reset_choices
+        # One throttled slot refreshes both layer comboboxes, so each layer
+        # event triggers a single rebuild and bursts collapse into one
+        self._reset_layer_choices = qthrottled(
+            self._do_reset_layer_choices, timeout=50
         )
+        self.viewer.layers.events.inserted.connect(self._reset_layer_choices)
+        self.viewer.layers.events.removed.connect(self._reset_layer_choices)
+        self.viewer.layers.events.removed.connect(self._on_layer_removed)
 
         self.layer_selection_group.glayout.addWidget(
             QLabel("Annotation layer"), 1, 0, 1, 1
@@ -125,6 +171,12 @@ class KeypointAnnotatorWidget(QWidget):
 
         # Let the user define the axes order
         self.axes_order = QLineEdit("")
+        # Mirror of the line edit's text, kept in sync by textChanged, so
+        # the save/load paths never have to call back into Qt
+        self._axes_order = ""
+        self.axes_order.textChanged.connect(
+            lambda text: setattr(self, "_axes_order", text)
+        )
         self.layer_selection_group.glayout.addWidget(
             QLabel("Axes order"), 3, 0, 1, 1
         )
@@ -145,14 +197,18 @@ class KeypointAnnotatorWidget(QWidget):
         self.keypoint_buttons = QButtonGroup(
             self
         )  # Using a button group to manage radio buttons
+        self._keypoint_to_button = {}
         keypoint_layout = QVBoxLayout()
         for kp in KEYPOINTS:
             btn = QRadioButton(kp)
-            btn.toggled.connect(self.on_keypoint_selected)
             self.keypoint_buttons.addButton(btn)
+            self._keypoint_to_button[kp] = btn
             keypoint_layout.addWidget(btn)
             if kp == INITIAL_SELECTED_KEYPOINT:
                 btn.setChecked(True)  # Set default selected keypoint
+        # One connection on the group instead of one per button; a keypoint
+        # change then dispatches a single slot call instead of two
+        self.keypoint_buttons.buttonToggled.connect(self.on_keypoint_selected)
 
         self.save_annotations_btn = QPushButton("Save annotations")
         self.load_annotations_btn = QPushButton("Load annotations")
@@ -188,7 +244,7 @@ class KeypointAnnotatorWidget(QWidget):
                 dir_edit.setText(dir_path)
                 return dir_path
             else:
-                print("Directory selection cancelled.")
+                logger.debug("Directory selection cancelled.")
                 return ""
 
         self.tabs.add_named_tab(
@@ -244,12 +300,9 @@ class KeypointAnnotatorWidget(QWidget):
         self.reference_files = []
         self.annotation_files = []
 
-        self.files_df = pd.DataFrame(
-            {
-                "Reference": self.reference_files,
-                "Annotation": self.annotation_files,
-            }
-        )
+        # Built by load_files; kept out of __init__ so pandas is only
+        # imported once the user actually saves or loads annotations
+        self.files_df = None
 
         self.save_annotations_project_btn = QPushButton("Save annotations")
         self.project_group.glayout.addWidget(
@@ -264,9 +317,22 @@ class KeypointAnnotatorWidget(QWidget):
 
         self.add_connections()
 
+    def _on_layer_removed(self, event):
+        # Drop the cached reference so we never touch a deleted layer
+        if event.value is self._annotation_layer_obj:
+            self._annotation_layer_obj = None
+
+    def _do_reset_layer_choices(self, event=None):
+        self.select_reference_layer_widget.reset_choices()
+        self.select_annotation_layer_widget.reset_choices()
+
     def add_connections(self):
-        self.select_reference_layer_widget.changed.connect(self.select_layer)
-        self.select_annotation_layer_widget.changed.connect(self.select_layer)
+        self.select_reference_layer_widget.changed.connect(
+            self._on_reference_layer_changed
+        )
+        self.select_annotation_layer_widget.changed.connect(
+            self._on_annotation_layer_changed
+        )
         self.add_annotation_layer_btn.clicked.connect(
             self.add_annotation_layer
         )
@@ -285,15 +351,18 @@ class KeypointAnnotatorWidget(QWidget):
             self.save_annotations_project
         )
 
+    @Slot()
     def select_layer(self, newtext=None):
+        self._on_reference_layer_changed()
+        self._on_annotation_layer_changed()
+
+    def _on_reference_layer_changed(self, newtext=None):
         self.selected_reference_layer = (
             self.select_reference_layer_widget.native.currentText()
         )
-        print(f"Selected reference layer: {self.selected_reference_layer}")
-        self.selected_annotation_layer = (
-            self.select_annotation_layer_widget.native.currentText()
+        logger.debug(
+            "Selected reference layer: %s", self.selected_reference_layer
         )
-        print(f"Selected annotation layer: {self.selected_annotation_layer}")
 
         if self.selected_reference_layer != "":
             if self.viewer.layers[self.selected_reference_layer].ndim == 3:
@@ -301,33 +370,44 @@ class KeypointAnnotatorWidget(QWidget):
             else:
                 self.axes_order.setText("YX")
 
-    def cycle_keypoint_down(self, event):
-        current_idx = KEYPOINTS.index(self.selected_keypoint)
-        new_idx = current_idx + 1
-        if new_idx >= len(KEYPOINTS):
-            new_idx = 0
+    def _on_annotation_layer_changed(self, newtext=None):
+        self.selected_annotation_layer = (
+            self.select_annotation_layer_widget.native.currentText()
+        )
+        logger.debug(
+            "Selected annotation layer: %s", self.selected_annotation_layer
+        )
+        # LayerList has no .get(), so spell out the membership check
+        if self.selected_annotation_layer in self.viewer.layers:
+            self._annotation_layer_obj = self.viewer.layers[
+                self.selected_annotation_layer
+            ]
+        else:
+            self._annotation_layer_obj = None
 
-        self.selected_keypoint = KEYPOINTS[new_idx]
+    def cycle_keypoint_down(self, event):
+        self._selected_idx = (self._selected_idx + 1) % len(KEYPOINTS)
+        self.selected_keypoint = KEYPOINTS[self._selected_idx]
         self.update_point_tool_color()
 
-        # Update the radio buttons
-        for btn in self.keypoint_buttons.buttons():
-            if btn.text() == self.selected_keypoint:
-                btn.setChecked(True)
+        # Update the radio buttons without re-triggering
+        # on_keypoint_selected, which would redo the color update; the
+        # handler listens on the group, so the group must be blocked
+        btn = self._keypoint_to_button[self.selected_keypoint]
+        with QSignalBlocker(self.keypoint_buttons):
+            btn.setChecked(True)
 
     def cycle_keypoint_up(self, event):
-        current_idx = KEYPOINTS.index(self.selected_keypoint)
-        new_idx = current_idx - 1
-        if new_idx < 0:
-            new_idx = len(KEYPOINTS) - 1
-
-        self.selected_keypoint = KEYPOINTS[new_idx]
+        self._selected_idx = (self._selected_idx - 1) % len(KEYPOINTS)
+        self.selected_keypoint = KEYPOINTS[self._selected_idx]
         self.update_point_tool_color()
 
-        # Update the radio buttons
-        for btn in self.keypoint_buttons.buttons():
-            if btn.text() == self.selected_keypoint:
-                btn.setChecked(True)
+        # Update the radio buttons without re-triggering
+        # on_keypoint_selected, which would redo the color update; the
+        # handler listens on the group, so the group must be blocked
+        btn = self._keypoint_to_button[self.selected_keypoint]
+        with QSignalBlocker(self.keypoint_buttons):
+            btn.setChecked(True)
 
     # def cycle_keypoint_on_add(self, event=None):
     #     print(f"selected keypoint: {self.selected_keypoint}")
@@ -345,9 +425,20 @@ class KeypointAnnotatorWidget(QWidget):
     #         if btn.text() == self.selected_keypoint:
     #             btn.setChecked(True)
 
+    @Slot()
     def add_annotation_layer(self):
         if self.selected_reference_layer == "":
-            print("No reference layer found")
+            logger.warning("No reference layer found")
+            return
+        if (
+            self._annotation_layer_obj is not None
+            and self._annotation_layer_obj in self.viewer.layers
+        ):
+            # Re-select the existing layer instead of stacking duplicates,
+            # each of which would re-trigger every inserted-event subscriber
+            self.select_annotation_layer_widget.native.setCurrentText(
+                self._annotation_layer_obj.name
+            )
             return
         if (
             self.selected_annotation_layer == ""
@@ -359,23 +450,30 @@ class KeypointAnnotatorWidget(QWidget):
                 if reference_layer.ndim == 3
                 else None
             )
-            initial_data = (
-                np.zeros((0, 3)) if z_dim else np.zeros((0, 2))
-            )  # Use ternary operator to set initial_data size
-            self.annotation_layer = self.viewer.add_points(
-                initial_data,
-                name="Annotations",
-                ndim=3 if z_dim else 2,
-                size=2,
-            )
+            initial_data = _EMPTY_3D if z_dim else _EMPTY_2D
+            # Insert the layer with our own inserted callback suppressed
+            # (other subscribers still see the event), then refresh the
+            # comboboxes once
+            with self.viewer.layers.events.inserted.blocker(
+                self._reset_layer_choices
+            ):
+                self.annotation_layer = self.viewer.add_points(
+                    initial_data,
+                    name="Annotations",
+                    ndim=3 if z_dim else 2,
+                    size=2,
+                )
+            self._do_reset_layer_choices()
 
-            print(
-                f"Annotation layer added with {'3D' if z_dim else '2D'} capabilities."
+            logger.debug(
+                "Annotation layer added with %s capabilities.",
+                "3D" if z_dim else "2D",
             )
             self.selected_annotation_layer = self.annotation_layer.name
+            self._annotation_layer_obj = self.annotation_layer
 
             # change the mode to add points
-            self.viewer.layers[self.selected_annotation_layer].mode = Mode.ADD
+            self.annotation_layer.mode = Mode.ADD
 
             self.update_point_tool_color()
 
@@ -384,29 +482,39 @@ class KeypointAnnotatorWidget(QWidget):
             #     self.selected_annotation_layer
             # ].events.data.connect(self.cycle_keypoint_on_add)
 
-    def on_keypoint_selected(self, checked):
-        radio_button = self.sender()
+    @Slot(QAbstractButton, bool)
+    def on_keypoint_selected(self, button, checked):
         if checked:
-            self.selected_keypoint = radio_button.text()
+            self.selected_keypoint = button.text()
+            self._selected_idx = _KEYPOINT_INDEX[self.selected_keypoint]
             self.update_point_tool_color()
 
     def update_point_tool_color(self):
-        if self.selected_annotation_layer == "":
+        annotation_layer = self._annotation_layer_obj
+        if annotation_layer is None:
+            return
+        target = self._palette[self._selected_idx]
+        # Skip the selection reset and the color events when the tool is
+        # already set to this keypoint's color; the getter returns the
+        # color as a string, so normalize it to RGBA before comparing
+        current = transform_color(annotation_layer.current_face_color)[0]
+        if np.array_equal(current, target):
             return
         # Deselect all points
-        self.viewer.layers[self.selected_annotation_layer].selected_data = []
+        annotation_layer.selected_data = []
         # Set the current face color to the selected keypoinr color
-        self.viewer.layers[
-            self.selected_annotation_layer
-        ].current_face_color = self.keypoint_colors[self.selected_keypoint]
-        print(
-            f"Ready to add points with color {self.keypoint_colors[self.selected_keypoint]} for keypoint {self.selected_keypoint}."
+        annotation_layer.current_face_color = target
+        logger.debug(
+            "Ready to add points with color %s for keypoint %s.",
+            target,
+            self.selected_keypoint,
         )
 
+    @Slot()
     def save_annotations(self):
-        annotations_df = self._convert_point_layer_to_df()
-
-        print(annotations_df)
+        columns = self._convert_point_layer_to_columns()
+        if columns is None:
+            return
 
         # open the file explorer to save the file
         dialog = QFileDialog()
@@ -416,62 +524,87 @@ class KeypointAnnotatorWidget(QWidget):
         save_file = Path(save_file)
 
         if save_file:
-            annotations_df.to_csv(save_file, index=False)
-            print(f"Annotations saved to {save_file}")
-
-    def _convert_point_layer_to_df(self):
-        if self.selected_annotation_layer == "":
-            print("No annotation layer selected")
+            self._write_annotations_csv(save_file, columns)
+            logger.info("Annotations saved to %s", save_file)
+
+    @staticmethod
+    def _write_annotations_csv(save_file, columns):
+        """Write the columns built by _convert_point_layer_to_columns to
+        a CSV file, without routing the flat scalar table through pandas."""
+        with open(save_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns.keys())
+            writer.writerows(zip(*columns.values()))
+
+    @staticmethod
+    def _pack_colors(colors):
+        """Pack an (N, 4) RGBA float array into one uint32 per color."""
+        quantized = np.rint(np.asarray(colors) * 255).astype(np.uint8)
+        return np.ascontiguousarray(quantized).view(np.uint32).ravel()
+
+    def _convert_point_layer_to_columns(self):
+        annotation_layer = self._annotation_layer_obj
+        if annotation_layer is None:
+            logger.warning("No annotation layer selected")
             return
 
-        annotation_layer = self.viewer.layers[self.selected_annotation_layer]
-        annotation_data = annotation_layer.data
-        print(f"Saving {annotation_data.shape[0]} annotations")
-        # Save the annotations to a file
-
-        print(annotation_data)
-
-        three_dimentional = len(self.axes_order.text()) == 3
-        rows = []
-        for point, color in zip(annotation_data, annotation_layer.face_color):
-            point = tuple(round(p) for p in point)
-            keypoint_value = self.color_to_keypoint.get(tuple(color), -1)
-            keypoint_name = self.keypoint_values_to_name.get(
-                keypoint_value, "unknown"
+        # Snapshot both properties once, as contiguous typed arrays, so the
+        # vectorized pipeline below runs over plain strided memory
+        annotation_data = np.ascontiguousarray(
+            annotation_layer.data, dtype=np.float64
+        )
+        face_color = np.ascontiguousarray(
+            annotation_layer.face_color, dtype=np.float32
+        )
+        logger.debug("Saving %d annotations", annotation_data.shape[0])
+
+        points = np.rint(annotation_data).astype(np.int64)
+
+        axes = self._axes_order
+        reference_shape = self.viewer.layers[
+            self.selected_reference_layer
+        ].data.shape
+
+        # Drop points dragged outside the reference image instead of
+        # writing coordinates that cannot be loaded back
+        valid = (
+            (points >= 0)
+            & (points < np.asarray(reference_shape[: points.shape[1]]))
+        ).all(axis=1)
+        if not valid.all():
+            logger.warning(
+                "Dropping %d point(s) outside the reference image",
+                int(np.count_nonzero(~valid)),
             )
+            points = points[valid]
+            face_color = face_color[valid]
+
+        # Vectorized color -> keypoint lookup: quantize each face color to a
+        # packed uint32 and binary-search the sorted palette hashes; the
+        # palette row index is the keypoint value itself
+        hashes = self._pack_colors(face_color)
+        idx = np.searchsorted(self._palette_hash_sorted, hashes)
+        idx = np.minimum(idx, len(self._palette_hash_sorted) - 1)
+        found = self._palette_hash_sorted[idx] == hashes
+        keypoint_values = np.where(found, self._palette_hash_order[idx], -1)
+        names = np.array([*self._palette_names, "unknown"], dtype=object)
+        keypoint_names = names[
+            np.where(found, keypoint_values, len(self._palette_names))
+        ]
+
+        columns = {"Name": keypoint_names, "KeypointID": keypoint_values}
+        if len(axes) == 3:
+            columns[axes[0]] = points[:, 0]
+            # normalize the point position as a percentage of the image size
+            columns[axes[1]] = points[:, 1] / reference_shape[1]
+            columns[axes[2]] = points[:, 2] / reference_shape[2]
+        else:
+            columns[axes[0]] = points[:, 0] / reference_shape[0]
+            columns[axes[1]] = points[:, 1] / reference_shape[1]
 
-            if three_dimentional:
-                row = {
-                    "Name": keypoint_name,
-                    "KeypointID": keypoint_value,
-                    self.axes_order.text()[0]: point[0],
-                    # normalize the point position as a percentage of the image size
-                    self.axes_order.text()[1]: point[1]
-                    / self.viewer.layers[
-                        self.selected_reference_layer
-                    ].data.shape[1],
-                    self.axes_order.text()[2]: point[2]
-                    / self.viewer.layers[
-                        self.selected_reference_layer
-                    ].data.shape[2],
-                }
-            else:
-                row = {
-                    "Name": keypoint_name,
-                    "KeypointID": keypoint_value,
-                    self.axes_order.text()[0]: point[0]
-                    / self.viewer.layers[
-                        self.selected_reference_layer
-                    ].data.shape[0],
-                    self.axes_order.text()[1]: point[1]
-                    / self.viewer.layers[
-                        self.selected_reference_layer
-                    ].data.shape[1],
-                }
-            rows.append(row)
-
-        return pd.DataFrame(rows)
+        return columns
 
+    @Slot()
     def load_annotations(self):
         # open the file explorer to load the file
         dialog = QFileDialog()
@@ -484,10 +617,20 @@ class KeypointAnnotatorWidget(QWidget):
             self._load_annotations(load_file)
 
     def _load_annotations(self, file_path):
-        annotations_df = pd.read_csv(file_path)
-        print(f"Annotations loaded from {file_path}")
+        import pandas as pd
 
-        print(annotations_df)
+        axes = self._axes_order
+        # Only parse the columns we consume, with fixed dtypes, so pandas
+        # skips type inference and the unused Name column
+        annotations_df = pd.read_csv(
+            file_path,
+            usecols=["KeypointID", *axes],
+            dtype={
+                "KeypointID": np.int64,
+                **dict.fromkeys(axes, np.float64),
+            },
+        )
+        logger.info("Annotations loaded from %s", file_path)
 
         if self.selected_annotation_layer == "":
             self.add_annotation_layer()
@@ -496,181 +639,192 @@ class KeypointAnnotatorWidget(QWidget):
             self.viewer.layers.remove(self.selected_annotation_layer)
             self.add_annotation_layer()
 
-        annotation_layer = self.viewer.layers[self.selected_annotation_layer]
-
-        three_dimentional = len(self.axes_order.text()) == 3
-        if three_dimentional:
-            unique_planes = annotations_df[self.axes_order.text()[0]].unique()
-            for plane in unique_planes:
-                plane_df = annotations_df[
-                    annotations_df[self.axes_order.text()[0]] == plane
-                ]
-                for _, row in plane_df.iterrows():
-                    point = [
-                        row[self.axes_order.text()[0]],
-                        row[self.axes_order.text()[1]],
-                        row[self.axes_order.text()[2]],
-                    ]
-                    annotation_layer.add(
-                        point,
-                    )
-                    annotation_layer.face_color[-1] = (
-                        self.keypoint_values_to_color[row["KeypointID"]]
-                    )
-
-                    # unselect the point
-                    annotation_layer.selected_data = []
-        else:
-            for _, row in annotations_df.iterrows():
-                point = [
-                    row[self.axes_order.text()[0]],
-                    row[self.axes_order.text()[1]],
-                ]
-                annotation_layer.add(
-                    point,
-                )
-
-                # unselect the point
-                annotation_layer.selected_data = []
+        annotation_layer = self._annotation_layer_obj
 
-                annotation_layer.face_color[-1] = (
-                    self.keypoint_values_to_color[row["KeypointID"]]
-                )
+        # Stack the axis columns into an (N, ndim) coordinate array and look
+        # up all the colors at once instead of adding points one by one
+        coords = np.column_stack(
+            [annotations_df[axis].to_numpy() for axis in axes]
+        )
+        ids = annotations_df["KeypointID"].to_numpy(dtype=np.int64)
+        valid = (ids >= 0) & (ids < len(self._palette))
+        if not valid.all():
+            logger.warning(
+                "%d annotations have an unknown KeypointID; coloring"
+                " them gray",
+                np.count_nonzero(~valid),
+            )
+        colors = np.where(
+            valid[:, np.newaxis], self._palette[ids * valid], _UNKNOWN_COLOR
+        )
 
-        # to prevent the last point's color from being overwritten, create a temporary point
-        annotation_layer.add([0, 0])
-        # remove the temporary point
-        annotation_layer.remove_selected()
+        # Rebuild the layer with its events suppressed, then redraw once;
+        # each attribute assignment otherwise refreshes the canvas and
+        # thumbnail separately
+        with annotation_layer.events.blocker_all():
+            annotation_layer.data = coords
+            annotation_layer.face_color = colors
+        annotation_layer.refresh()
 
-        print(f"Loaded {annotations_df.shape[0]} annotations")
+        logger.debug("Loaded %d annotations", annotations_df.shape[0])
 
     def _load_file(self):
-        # clear the current layers
-        self.viewer.layers.select_all()
-        self.viewer.layers.remove_selected()
+        # clear the current layers in one batch; block only this widget's
+        # refresh callback so napari's own removed-event subscribers (the
+        # layer-list model in particular) still see every removal
+        with self.viewer.layers.events.removed.blocker(
+            self._reset_layer_choices
+        ):
+            self.viewer.layers.clear()
+        self._annotation_layer_obj = None
+        self._do_reset_layer_choices()
 
         row = self.files_df.iloc[self.current_file_idx]
         reference_file = row["Reference"]
         annotation_file = row["Annotation"]
 
-        self.viewer.open(reference_file)
+        self._open_reference(reference_file)
+        # Refresh the pickers synchronously: the throttled slot may still be
+        # inside its window here, and add_annotation_layer below needs the
+        # reference selection to be current
+        self._do_reset_layer_choices()
+        self.select_layer()
         if annotation_file != "":
             self._load_annotations(annotation_file)
         else:
             self.add_annotation_layer()
 
+    def _open_reference(self, reference_file):
+        # Open through dask-image when it is available so large stacks are
+        # materialized lazily instead of blocking the event loop on a full
+        # read; fall back to napari's synchronous reader otherwise
+        try:
+            from dask_image.imread import imread
+        except ImportError:
+            self.viewer.open(reference_file)
+            return
+        data = imread(reference_file)
+        if data.shape[0] == 1:
+            # dask-image always returns (nframes, H, W); drop the frame
+            # axis for plain 2D images so the layer ndim, and with it the
+            # axes order and CSV schema, match napari's own reader
+            data = data[0]
+        self.viewer.add_image(data, name=os.path.basename(reference_file))
+
+    @Slot()
     def load_files(self):
+        import pandas as pd
+
         reference_dir = self.reference_dir_edit.text()
 
         if reference_dir == "":
-            print("Please select a reference directory")
+            logger.warning("Please select a reference directory")
             return
 
-        reference_files = sorted(
-            [os.path.join(reference_dir, f) for f in os.listdir(reference_dir)]
-        )
+        reference_files = _cached_listdir(reference_dir)
 
         self.reference_files = reference_files
         self.current_file_idx = 0
 
-        print(self.reference_files)
-
-        rows = []
-
-        for reference_file in self.reference_files:
-
-            row = {
-                "Reference": reference_file,
-                "Annotation": "",
+        self.files_df = pd.DataFrame(
+            {
+                "Reference": reference_files,
+                "Annotation": [""] * len(reference_files),
             }
-            rows.append(row)
-
-        self.files_df = pd.DataFrame(rows)
-
-        print(self.files_df)
+        )
+        # Basename stems are reused for annotation matching and for naming
+        # the per-file output CSVs, so compute them once
+        self.files_df["_basename"] = [
+            os.path.splitext(os.path.basename(f))[0] for f in reference_files
+        ]
 
-        # populate the list widget
+        # populate the list widget in a single batch insert
         self.file_list.clear()
-        for _, row in self.files_df.iterrows():
-            item = f"{os.path.basename(row['Reference'])}"
-            self.file_list.addItem(item)
+        self.file_list.addItems([os.path.basename(f) for f in reference_files])
 
         self._load_file()
 
+    @Slot()
     def load_annotation_files(self):
         annotation_dir = self.annotation_dir_edit.text()
 
         if annotation_dir == "":
-            print("Please select an annotation directory")
+            logger.warning("Please select an annotation directory")
             return
 
         if self.reference_files == []:
-            print("Please load reference files first")
+            logger.warning("Please load reference files first")
             return
 
-        annotation_files = sorted(
-            [
-                os.path.join(annotation_dir, f)
-                for f in os.listdir(annotation_dir)
-            ]
-        )
+        annotation_files = _cached_listdir(annotation_dir)
 
         self.annotation_files = annotation_files
 
         # add the annotation files to the dataframe by matching the names
+        basename_to_idx = {
+            basename: i
+            for i, basename in enumerate(self.files_df["_basename"])
+        }
+        indices = []
+        matched_files = []
         for annotation_file in annotation_files:
             name = os.path.splitext(os.path.basename(annotation_file))[0]
-            for i, row in self.files_df.iterrows():
-                if name in row["Reference"]:
-                    self.files_df.loc[i, "Annotation"] = annotation_file
-                    break
+            idx = basename_to_idx.get(name)
+            if idx is not None:
+                indices.append(idx)
+                matched_files.append(annotation_file)
 
-        self.files_df["Annotation"] = self.files_df["Annotation"].fillna("")
-
-        print(self.files_df)
+        # One positional write instead of a label-aligned assignment per
+        # matched file; iloc keeps it writable under copy-on-write
+        self.files_df.iloc[
+            indices, self.files_df.columns.get_loc("Annotation")
+        ] = matched_files
 
         if self.files_df.loc[self.current_file_idx, "Annotation"] != "":
             self._load_annotations(
                 self.files_df.loc[self.current_file_idx, "Annotation"]
             )
 
-    def next_file(self, event):
-        annotations_df = self._convert_point_layer_to_df()
+    @Slot()
+    def next_file(self, event=None):
+        columns = self._convert_point_layer_to_columns()
+        n_points = len(columns["Name"]) if columns is not None else 0
         output_dir = self.annotation_dir_edit.text()
-        name = os.path.splitext(
-            os.path.basename(self.reference_files[self.current_file_idx])
-        )[0]
+        name = self.files_df.at[self.current_file_idx, "_basename"]
         output_path = os.path.join(output_dir, f"{name}.csv")
 
-        if not os.path.exists(output_path) and len(annotations_df) > 0:
+        if not os.path.exists(output_path) and n_points > 0:
             self.save_annotations_project()
 
         if self.current_file_idx >= len(self.files_df):
-            print("No more files to load")
+            logger.warning("No more files to load")
             return
 
         self.current_file_idx += 1
         self._load_file()
 
-    def previous_file(self, event):
+    @Slot()
+    def previous_file(self, event=None):
         if self.current_file_idx <= 0:
-            print("No more files to load")
+            logger.warning("No more files to load")
             return
 
         self.current_file_idx -= 1
         self._load_file()
 
+    @Slot()
     def save_annotations_project(self):
-        annotations_df = self._convert_point_layer_to_df()
+        columns = self._convert_point_layer_to_columns()
+        if columns is None:
+            return
 
         output_dir = self.annotation_dir_edit.text()
-        name = os.path.splitext(
-            os.path.basename(self.reference_files[self.current_file_idx])
-        )[0]
+        name = self.files_df.at[self.current_file_idx, "_basename"]
         output_path = os.path.join(output_dir, f"{name}.csv")
         self.files_df.loc[self.current_file_idx, "Annotation"] = output_path
-        annotations_df.to_csv(output_path, index=False)
+        self._write_annotations_csv(output_path, columns)
 
+    @Slot()
     def choose_file_from_list(self):
         self.current_file_idx = self.file_list.currentRow()
         self._load_file()